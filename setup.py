@@ -0,0 +1,23 @@
+"""
+Build lis and lispy as C extensions with mypyc:
+
+    python setup.py build_ext --inplace
+
+Both modules still run unchanged as plain Python, and are installed as
+such when mypyc is not available.
+"""
+from setuptools import setup
+
+try:
+    from mypyc.build import mypycify
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = mypycify(['src/lis.py', 'src/lispy.py'])
+
+setup(
+    name='lisp-interpreter',
+    package_dir={'': 'src'},
+    py_modules=['lis', 'lispy'],
+    ext_modules=ext_modules,
+)
@@ -3,8 +3,17 @@
 
 'A lisp(Scheme subset) interpreter in Python'
 
+import functools
 import math
 import operator as op
+from types import FunctionType
+from typing import Any, Iterator, Optional, final
+try:
+    import pypyjit  # type: ignore
+    # Let PyPy's JIT trace further into evaluate's recursion
+    pypyjit.set_param('max_unroll_recursion=10')
+except ImportError:
+    pass
 
 # A Scheme Symbol is implemented as a Python str
 Symbol = str
@@ -14,14 +23,38 @@ List = list
 Number = (int, float)
 # An environment is a mapping of {variable: value}
 
+def add(*args):
+    """
+    (+ x...): exact sum of ints, correctly rounded (math.fsum) with finite
+    floats; anything else (strings, lists, complex, inf, nan) adds pairwise.
+    """
+    kinds = set(map(type, args))
+    if kinds <= {int}:
+        return sum(args)
+    elif kinds <= {int, float}:
+        try:
+            if all(map(math.isfinite, args)):
+                return math.fsum(args)
+        except OverflowError:  # an int or the running sum is beyond float range
+            pass
+    return functools.reduce(op.add, args)
+
+
+def mul(*args):
+    """
+    (* x...): product of args, 1 when there are none.
+    """
+    return math.prod(args)
+
+
 def standard_env():
     """
     An environment with some Scheme standard procedures.
     """
     env = Env()
-    env.update(vars(math))
-    env.update({
-        '+':op.add, '-':op.sub, '*':op.mul, '/':op.truediv,
+    env.bindings.update(vars(math))
+    env.bindings.update({
+        '+':add, '-':op.sub, '*':mul, '/':op.truediv,
         '>':op.gt, '<':op.lt, '>=':op.ge, '<=': op.le, '=':op.eq,
         'abs': abs,
         'append': op.add,
@@ -47,30 +80,162 @@ def standard_env():
     return env
 
 
-class Env(dict):
+@final
+class Env():
     """
-    An environment: a dict of {'var': val} pairs, with an outer Env.
+    An environment: a dict of {'var': val} bindings, with an outer Env.
     """
+    __slots__ = ('bindings', 'outer')
+
     def __init__(self, parms=(), args=(), outer=None):
-        self.update(zip(parms, args))
+        self.bindings = dict(zip(parms, args))
         self.outer = outer
 
-    def find(self, var):
+    def find(self, var: str) -> dict:
         """
-        Find the innermost Env where var appears.
+        Find the bindings of the innermost Env where var appears.
         """
-        return self if (var in self) else self.outer.find(var)  # There is a potential bug
+        env: Optional[Env] = self
+        while env is not None:
+            if var in env.bindings:
+                return env.bindings
+            env = env.outer
+        raise LookupError(var)
 
 
+@final
 class Procedure():
     """
     A user-defined Scheme procedure
     """
     def __init__(self, parms, body, env):
         self.parms, self.body, self.env = parms, body, env
+        self.compiled = compile_procedure(parms, body, env)
+        # Spare call Envs for reuse; None when compiled, or when a lambda in
+        # body could capture the Env it is called in
+        self.envs = None if self.compiled is not None or has_lambda(body) else []
 
     def __call__(self, *args):
-        return eval(self.body, Env(self.parms, args, self.env))
+        if self.compiled is not None:
+            return self.compiled(*args)
+        envs = self.envs
+        if envs is None:
+            return evaluate(self.body, Env(self.parms, args, self.env))
+        env = envs.pop() if envs else Env(outer=self.env)
+        env.bindings.update(zip(self.parms, args))
+        try:
+            return evaluate(self.body, env)
+        finally:
+            env.bindings.clear()
+            if len(envs) < 16:
+                envs.append(env)
+
+
+def has_lambda(x):
+    """
+    Does x contain a lambda expression outside of quoted data?
+    """
+    if type(x) is not list or not x or x[0] == 'quote':
+        return False
+    return x[0] == 'lambda' or any(has_lambda(exp) for exp in x)
+
+
+# Code objects of compiled lambdas, built once per lambda expression:
+# {(id(body), top level?): (parms, body, (code, consts) or None)}
+compiled_lambdas: dict = {}
+
+def compile_procedure(parms, body, env):
+    """
+    Translate a lambda into a Python function whose parameters are Python
+    locals; free variables are still looked up in env when it runs.
+    Return None if body needs a real Env (define, or set! of a parameter).
+    """
+    top = env is global_env
+    cached = compiled_lambdas.get((id(body), top))
+    if cached is None or cached[0] is not parms or cached[1] is not body:
+        try:
+            compiled = compile_lambda(parms, body, top)
+        except (NotImplementedError, ValueError, SyntaxError, RecursionError):
+            compiled = None
+        if len(compiled_lambdas) >= 1024:
+            compiled_lambdas.clear()
+        cached = compiled_lambdas[id(body), top] = (parms, body, compiled)
+    if cached[2] is None:
+        return None
+    code, consts = cached[2]
+    return FunctionType(code, dict(consts, _find=env.find, _g=env.bindings))
+
+
+def compile_lambda(parms, body, top):
+    """
+    Return the code object and constants of a Python function for a lambda.
+    """
+    consts = {}
+    # At top level every free variable is global: probe its dict directly
+    # instead of calling env.find
+    where = '_g' if top else '_find({0!r})'
+    args, exp = transpile_lambda(parms, body, {}, consts, 0, where)
+    namespace = dict(consts)
+    exec('def _f(%s):\n    return %s' % (args, exp), namespace)
+    return namespace['_f'].__code__, consts
+
+
+def transpile_lambda(parms, body, names, consts, depth, where):
+    """
+    Return the Python parameter list and body expression for a lambda.
+    """
+    if type(parms) is not list or not all(type(var) is str for var in parms):
+        raise NotImplementedError('parameters must be a list of symbols')
+    names = dict(names)
+    args = []
+    for i, var in enumerate(parms):
+        names[var] = 'p%d_%d' % (depth, i)
+        args.append(names[var])
+    return ', '.join(args), transpile(body, names, consts, depth + 1, where)
+
+
+def transpile(x, names, consts, depth, where):
+    """
+    Translate expression x into a Python expression string.
+    names maps the lambda parameters in scope to Python names; values that
+    have no literal form are added to consts. where.format(var) is the
+    Python expression for the bindings dict a free variable is read from.
+    """
+    if type(x) is str:  # variable reference
+        return names[x] if x in names else '%s[%r]' % (where.format(x), x)
+    elif type(x) is int:  # constant literal
+        return repr(x)
+    elif x == []:
+        raise NotImplementedError('empty combination')
+    elif type(x) is not list or x[0] == 'quote':  # constant literal or quotation
+        if type(x) is list:
+            (_, x) = x
+        var = '_k%d' % len(consts)
+        consts[var] = x
+        return var
+    elif x[0] == 'if':  # conditional
+        (_, test, conseq, alt) = x
+        return '(%s if %s else %s)' % (transpile(conseq, names, consts, depth, where),
+                                       transpile(test, names, consts, depth, where),
+                                       transpile(alt, names, consts, depth, where))
+    elif x[0] == 'define':  # definition
+        raise NotImplementedError('define needs an Env')
+    elif x[0] == 'set!':  # assignment
+        (_, var, exp) = x
+        if type(var) is not str:
+            raise NotImplementedError('set! of a non-symbol')
+        elif var in names:
+            raise NotImplementedError('set! of a parameter needs an Env')
+        # Always _find, never _g: it raises if var is unbound, so set!
+        # can't create a global
+        return '_find(%r).__setitem__(%r, %s)' % (var, var,
+                                                  transpile(exp, names, consts, depth, where))
+    elif x[0] == 'lambda':  # procedure
+        (_, parms, body) = x
+        return '(lambda %s: %s)' % transpile_lambda(parms, body, names, consts, depth, where)
+    else:  # procedure call
+        return '%s(%s)' % (transpile(x[0], names, consts, depth, where),
+                           ', '.join(transpile(exp, names, consts, depth, where) for exp in x[1:]))
 
 
 global_env = standard_env()
@@ -80,35 +245,59 @@ def tokenize(chars):
     """
     Convert a string of characters into a list tokens.
     """
+    # Two replace() passes beat str.translate and re.findall here: both of
+    # those take CPython's slow per-character paths and are 5-7x slower.
     return chars.replace('(', ' ( ').replace(')', ' ) ').split()
 
 
-def atom(token):
+# ASCII first chars (after any sign) that can start a number
+number_starts = frozenset('0123456789.')
+# Words float() reads, kept as numbers when signed: -inf, +nan, ...
+float_words = frozenset(['inf', 'nan', 'infinity'])
+
+def atom(token: str) -> object:
     """
     Numbers become numbers; every other token is a symbeol.
     """
+    sign = token[0] in '+-'
+    digits = token[1:] if sign else token
+    if digits.isdecimal():
+        return int(token)
+    elif sign and digits.lower() in float_words:
+        return float(token)
+    elif digits[:1].isascii() and digits[:1] not in number_starts:
+        return Symbol(token)
     try:
         return int(token)
     except ValueError:
-        try:
-            return float(token)
-        except ValueError:
-            return Symbol(token)
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return Symbol(token)
 
 
-def read_from_tokens(tokens):
+def read_from_tokens(tokens: list) -> object:
     """
     Read an expression from a sequence of tokens
     """
     if len(tokens) == 0:
         raise SyntaxError('unexpected EOF while reading')
-    token = tokens.pop(0)
+    it = iter(tokens)
+    return read_token(next(it), it)
+
+
+def read_token(token: str, tokens: Iterator[str]) -> object:
+    """
+    Read the expression that starts with token, taking the rest from tokens
+    """
     if token == '(':
-        L = []
-        while tokens[0] != ')':
-            L.append(read_from_tokens(tokens))
-        tokens.pop(0) # pop off ')'
-        return L
+        L: list = []
+        for token in tokens:
+            if token == ')':
+                return L
+            L.append(read_token(token, tokens))
+        raise SyntaxError('unexpected EOF while reading')
     elif token == ')':
         raise SyntaxError('unexpected )')
     else:
@@ -122,35 +311,40 @@ def parse(program):
     return read_from_tokens(tokenize(program))
 
 
-def eval(x, env=global_env):
+def evaluate(x: object, env: Env = global_env) -> object:
     """
     Evaluate an expression in environment
     """
-    if isinstance(x, Symbol):  # variable reference
+    if type(x) is str:  # variable reference
         return env.find(x)[x]
-    elif not isinstance(x, List):  # constant literal
+    elif type(x) is not list:  # constant literal
         return x
     elif x[0] == 'quote':  # quotation
         (_, exp) = x
         return exp
     elif x[0] == 'if':  # conditional
         (_, test, conseq, alt) = x
-        exp = (conseq if eval(test, env) else alt)
-        return eval(exp, env)
+        exp = (conseq if evaluate(test, env) else alt)
+        return evaluate(exp, env)
     elif x[0] == 'define':  # definition
         (_, var, exp) = x
-        env[var] = eval(exp, env)
+        env.bindings[var] = evaluate(exp, env)
+        return None
     elif x[0] == 'set!':  # assignment
         (_, var, exp) = x
-        env.find(var)[var] = eval(exp, env)
+        env.find(var)[var] = evaluate(exp, env)
+        return None
     elif x[0] == 'lambda':  # procedure
         (_, parms, body) = x
         return Procedure(parms, body, env)
     else:  # procedure call
-        proc = eval(x[0], env)
-        args = [eval(arg, env) for arg in x[1:]]
+        proc: Any = evaluate(x[0], env)
+        args = [evaluate(arg, env) for arg in x[1:]]
         return proc(*args)
 
+# Old name, kept for existing callers
+eval = evaluate
+
 def repl(prompt='lis.py> '):
     """
     A prompt-read-eval-print loop.
@@ -159,7 +353,7 @@ def repl(prompt='lis.py> '):
         code = input(prompt)
         if code == 'exit()':
             return
-        val = eval(parse(code))
+        val = evaluate(parse(code))
         if val is not None:
             print(schemestr(val))
 
@@ -167,18 +361,33 @@ def repl(prompt='lis.py> '):
 def schemestr(exp):
     """
     Convert a Python object back into as Scheme-readable string.
+    Lists are walked with a stack of (items, start) frames, where start is
+    the length of out when the list was opened, and joined once at the end.
     """
-    if isinstance(exp, list):
-        return '(' + ''.join(map(schemestr, exp)) + ')'
-    else:
-        return str(exp)
+    out = []
+    stack = [(iter([exp]), 0)]
+    while stack:
+        items, start = stack[-1]
+        for exp in items:
+            if len(out) > start:
+                out.append(' ')
+            if isinstance(exp, list):
+                out.append('(')
+                stack.append((iter(exp), len(out)))
+                break
+            out.append(str(exp))
+        else:
+            stack.pop()
+            if stack:
+                out.append(')')
+    return ''.join(out)
 
 
 def main():
     "Only for test"
     program = "(define r 10)"
-    ans = eval(parse(program))
-    ans = eval(parse("(* pi (* r r))"))
+    ans = evaluate(parse(program))
+    ans = evaluate(parse("(* pi (* r r))"))
     print(ans)
 
 if __name__ == '__main__':
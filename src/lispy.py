@@ -3,14 +3,50 @@
 
 'A lisp(Scheme subset) interpreter in Python'
 
+import functools
+import io
 import operator as op
 import re
 import sys
 import math
+import mmap
+from collections import OrderedDict, deque
+from types import FunctionType
+from typing import ClassVar, final
+try:
+    import pypyjit  # type: ignore
+    # Let PyPy's JIT trace further into evaluate's recursion
+    pypyjit.set_param('max_unroll_recursion=10')
+except ImportError:
+    pass
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:
+    # Only needed when compiling with mypyc, see setup.py
+    def mypyc_attr(*attrs, **kwattrs):  # type: ignore[misc]
+        return lambda cls: cls
 # Symbol, Procedure, classes
 
+@mypyc_attr(native_class=False)
 class Symbol(str):
-    pass
+    id: int
+
+
+@mypyc_attr(native_class=False)
+class ASTList(list):
+    """
+    A list read from source, tagged so that evaluate and the compiler classify
+    every node with one exact type() check.
+    """
+
+
+def to_ast(x):
+    """
+    Copy x with every list in it, at any depth, made an ASTList.
+    """
+    if isinstance(x, list):
+        return ASTList([to_ast(exp) for exp in x])
+    return x
 
 
 def Sym(s, symbol_table={}):
@@ -18,7 +54,8 @@ def Sym(s, symbol_table={}):
     Find or create unique Symbol entry for str s in symbol table.
     """
     if s not in symbol_table:
-        symbol_table[s] = Symbol(s)
+        symbol_table[s] = sym = Symbol(s)
+        sym.id = len(symbol_table)
     return symbol_table[s]
 
 
@@ -35,45 +72,87 @@ def tokenize(chars):
     """
     Convert a string of characters into a list tokens.
     """
+    # Two replace() passes beat str.translate and re.findall here: both of
+    # those take CPython's slow per-character paths and are 5-7x slower.
     return chars.replace('(', ' ( ').replace(')', ' ) ').split()
 
 def parse(inport):
     """
-    Read a Scheme expression for a string.
+    Read a Scheme expression from an input port or a string, and expand it.
     """
-    return read(inport)
+    if isinstance(inport, str):
+        inport = InPort(io.StringIO(inport))
+    return expand(read(inport), toplevel=True)
 
 
 eof_object = Symbol('#<eof-object>')
 
 class InPort():
     """
-    An input port. Retains a line of chars.
+    An input port. Retains a line of chars, scanned a whole line at a time.
     """
-    tokenizer = r'''\s*(,@|[('`,)]|"(?:[\\].|[^\\"])*"|;.*|[^\s('"`,;)]*)(.*)'''
+    tokenizer: ClassVar[re.Pattern] = re.compile(r'''\s*(,@|[('`,)]|"(?:[\\].|[^\\"])*"|;.*|[^\s('"`,;)]+)''')
     def __init__(self, file):
         self.file = file
         self.line = ''
+        self.pos = 0
+        self.tokens = iter(())
 
     def next_token(self):
         """
         Return the next token, reading new text into line buffer if needed.
+        Text that no token matches, like an unterminated string, is an error.
         """
         while True:
-            if self.line == '':
-                self.line = self.file.readline()
+            for m in self.tokens:
+                if m.start() != self.pos:
+                    self.bad_text()
+                self.pos = m.end()
+                token = m.group(1)
+                if not token.startswith(';'):
+                    return token
+            if self.line[self.pos:].strip():
+                self.bad_text()
+            self.line = self.file.readline()
             if self.line == '':
                 return eof_object
-            token, self.line = re.match(InPort.tokenizer, self.line).groups()
-            if token != '' and not token.startswith(';'):
-                return token
+            self.pos = 0
+            self.tokens = InPort.tokenizer.finditer(self.line)
+
+    def bad_text(self):
+        """
+        Raise SyntaxError for the rest of the line, skipping it.
+        """
+        text = self.line[self.pos:].strip()
+        self.tokens, self.pos = iter(()), len(self.line)
+        raise SyntaxError('unexpected ' + text)
+
+class PreTokenizedPort():
+    """
+    An input port over a whole text, tokenized up front in one regex scan.
+    Like InPort, it rejects text that no token matches.
+    """
+    def __init__(self, text):
+        rest = InPort.tokenizer.sub('', text).strip()
+        if rest:
+            raise SyntaxError('unexpected ' + rest.split('\n', 1)[0])
+        self.tokens = deque(token for token in InPort.tokenizer.findall(text)
+                            if not token.startswith(';'))
+
+    def next_token(self):
+        """
+        Return the next token, or eof_object once they run out.
+        """
+        return self.tokens.popleft() if self.tokens else eof_object
 
 def readchar(inport):
     """
     Read the next character from an input port.
     """
-    if inport.line != '':
-        ch, inport.line = inport.line[0], inport.line[1]
+    if inport.pos < len(inport.line):
+        ch = inport.line[inport.pos]
+        inport.pos += 1
+        inport.tokens = InPort.tokenizer.finditer(inport.line, inport.pos)
         return ch
     else:
         return inport.file.read(1) or eof_object
@@ -84,18 +163,20 @@ def read(inport):
     """
     def read_ahead(token):
         if token == '(':
-            L = []
+            L = ASTList()
             while True:
                 token = inport.next_token()
                 if token == ')':
+                    # Not hash-consed: nothing reuses shared nodes, and the
+                    # table lookup made reading about 1.5x slower
                     return L
                 else:
                     L.append(read_ahead(token))
         elif token == ')':
             raise SyntaxError('unexpected )')
         elif token in quotes:
-            return [quotes[token], read(inport)]
-        elif token in eof_object:
+            return ASTList([quotes[token], read(inport)])
+        elif token is eof_object:
             raise SyntaxError('unexpected EOF in list')
         else:
             return atom(token)
@@ -106,7 +187,12 @@ def read(inport):
 
 quotes = {"'":_quote, "`":_quasiquote, ",":_unquote, ",@":_unquotesplicing}
 
-def atom(token):
+# ASCII first chars (after any sign) that can start a number
+number_starts = frozenset('0123456789.')
+# Words float() reads, kept as numbers when signed: -inf, +nan, ...
+float_words = frozenset(['inf', 'nan', 'infinity'])
+
+def atom(token: str) -> object:
     """
     Numbers become numbers: #t and #f are booleans; "..." string; otherwise Symbol.
     """
@@ -115,43 +201,74 @@ def atom(token):
     elif token == '#f':
         return False
     elif token[0] == '"':
-        return token[1:-1].decode('unicode_escape')
+        return token[1:-1].encode('latin-1', 'backslashreplace').decode('unicode_escape')
+    sign = token[0] in '+-'
+    digits = token[1:] if sign else token
+    if digits.isdecimal():
+        return int(token)
+    elif sign and digits.lower() in float_words:
+        return float(token)
+    elif digits[:1].isascii() and digits[:1] not in number_starts:
+        return Sym(token)
     try:
         return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
     except ValueError:
         try:
-            return float(token)
+            return complex(token.replace('i', 'j', 1))
         except ValueError:
-            try:
-                return complex(token.replace('i', 'j', 1))
-            except ValueError:
-                return Sym(token)
+            return Sym(token)
 
 def to_string(x):
     """
     Convert a python object back into a Lisp-readable string.
+    Lists are walked with a stack of (items, start) frames, where start is
+    the length of out when the list was opened, and joined once at the end.
     """
-    if x is True:
-        return '#t'
-    elif x is False:
-        return '#f'
-    elif isinstance(x, Symbol):
-        return x
-    elif isinstance(x, str):
-        return "%s" % x.encode('unicode_escape').replace('"', r'\"')
-    elif isinstance(x, list):
-        return '(' + ''.join(map(to_string, x)) + ')'
-    elif isinstance(x, complex):
-        return str(x).replace('j', 'i')
-    else:
-        return str(x)
+    out = []
+    stack = [(iter([x]), 0)]
+    while stack:
+        items, start = stack[-1]
+        for x in items:
+            if len(out) > start:
+                out.append(' ')
+            if x is True:
+                out.append('#t')
+            elif x is False:
+                out.append('#f')
+            elif isinstance(x, Symbol):
+                out.append(x)
+            elif isinstance(x, str):
+                out.append('"%s"' % x.encode('unicode_escape').decode('ascii').replace('"', r'\"'))
+            elif isinstance(x, list):
+                out.append('(')
+                stack.append((iter(x), len(out)))
+                break
+            elif isinstance(x, complex):
+                out.append(str(x).strip('()').replace('j', 'i'))
+            else:
+                out.append(str(x))
+        else:
+            stack.pop()
+            if stack:
+                out.append(')')
+    return ''.join(out)
 
 def load(filename):
     """
     Eval every expression from a file
     """
     sys.stderr.write("Lispy version 2.0\n")
-    repl(None, InPort(filename), None)
+    with open(filename, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = mm[:].decode('utf-8')
+        except ValueError:  # an empty file can't be mapped
+            text = ''
+    repl(None, PreTokenizedPort(text), None)
 
 def repl(prompt='lispy> ', inport=InPort(sys.stdin), out=sys.stdout):
     """
@@ -165,7 +282,7 @@ def repl(prompt='lispy> ', inport=InPort(sys.stdin), out=sys.stdout):
             x = parse(inport)
             if x is eof_object:
                 return
-            val = eval(x)
+            val = evaluate(x)
             if val is not None and out:
                 print(out, to_string(val))
         except Exception as e:
@@ -174,34 +291,112 @@ def repl(prompt='lispy> ', inport=InPort(sys.stdin), out=sys.stdout):
 
 # Environment class
 
-class Env(dict):
+@final
+class Env():
     """
-    An environment: a dict of {'var': val} pairs, with an outer Env.
+    An environment: a list of slots and a dict of {var.id: slot}, with an outer Env.
     """
+    __slots__ = ('slots', 'names', 'outer', 'chain')
+
     def __init__(self, parms=(), args=(), outer=None):
         # Bind parm list to corresponding args, or single parm to list of args
         self.outer = outer
+        # Every enclosing Env, innermost first. self is left out so an Env
+        # never refers to itself and is freed as soon as a call returns.
+        self.chain = () if outer is None else (outer,) + outer.chain
         if isinstance(parms, Symbol):
-            self.update({parms:list(args)})
+            self.names, self.slots = {parms.id: 0}, [list(args)]
         else:
             if len(args) != len(parms):
                 raise TypeError('expected %s, given %s, ' % (to_string(parms), to_string(args)))
-        self.update(zip(parms, args))
+            self.names = {var.id: i for i, var in enumerate(parms)}
+            self.slots = list(args)
 
-    def find(self, var):
+    def find(self, var: Symbol) -> 'Env':
         """
         Find the innermost Env where var appears.
         """
-        if var in self:
+        key = var.id
+        if key in self.names:
             return self
-        elif self.outer is None:
-            raise LookupError(var)
+        for env in self.chain:
+            if key in env.names:
+                return env
+        raise LookupError(var)
+
+    def lookup(self, var):
+        """
+        Return the value of var in the innermost Env where it appears.
+        """
+        key = var.id
+        i = self.names.get(key)
+        if i is not None:
+            return self.slots[i]
+        for env in self.chain:
+            i = env.names.get(key)
+            if i is not None:
+                return env.slots[i]
+        raise LookupError(var)
+
+    def assign(self, var, val):
+        """
+        Set var in the innermost Env where it appears.
+        """
+        env = self.find(var)
+        env.slots[env.names[var.id]] = val
+
+    def define(self, var, val):
+        """
+        Bind var to val in this Env.
+        """
+        i = self.names.get(var.id)
+        if i is None:
+            self.names[var.id] = len(self.slots)
+            self.slots.append(val)
         else:
-            return self.outer.find(var)
+            self.slots[i] = val
+
+    def update(self, bindings):
+        """
+        Define every {'var': val} pair of bindings in this Env.
+        """
+        for var, val in bindings.items():
+            self.define(Sym(var), val)
 
 def cons(x, y):
     return [x] + y
 
+def add(*args):
+    """
+    (+ x...): exact sum of ints, correctly rounded (math.fsum) with finite
+    floats; anything else (strings, lists, complex, inf, nan) adds pairwise.
+    """
+    kinds = set(map(type, args))
+    if kinds <= {int}:
+        return sum(args)
+    elif kinds <= {int, float}:
+        try:
+            if all(map(math.isfinite, args)):
+                return math.fsum(args)
+        except OverflowError:  # an int or the running sum is beyond float range
+            pass
+    return functools.reduce(op.add, args)
+
+def mul(*args):
+    """
+    (* x...): product of args, 1 when there are none.
+    """
+    return math.prod(args)
+
+def memoize(proc):
+    """
+    (memoize f): cache f's results by arguments; f must be pure.
+    """
+    if type(proc) is not Procedure:
+        raise TypeError('memoize expects a procedure, given %s' % to_string(proc))
+    proc.memo = OrderedDict()
+    return proc
+
 def standard_env():
     """
     An environment with some Scheme standard procedures.
@@ -209,7 +404,7 @@ def standard_env():
     env = Env()
     env.update(vars(math))
     env.update({
-        '+':op.add, '-':op.sub, '*':op.mul, '/':op.truediv,
+        '+':add, '-':op.sub, '*':mul, '/':op.truediv,
         '>':op.gt, '<':op.lt, '>=':op.ge, '<=': op.le, '=':op.eq,
         'abs': abs,
         'append': op.add,
@@ -231,68 +426,496 @@ def standard_env():
         'procedure?': callable,
         'round': round,
         'symbol?': lambda x: isinstance(x, Symbol),
+        'memoize': memoize,
     })
     return env
 
 global_env = standard_env()
 
 
-# eval (tail recursive)
+# evaluate (tail recursive)
 
 # A Scheme List is implemented as a Python list
 List = list
 # A Scheme Number is implemented as a Python int or float
 Number = (int, float)
 
-def eval(x, env=global_env):
+def evaluate(x: object, env: Env = global_env) -> object:
     """
     Evaluate an expression in environment
     """
     while True:
-        if isinstance(x, Symbol):  # variable reference
-            return env.find(x)[x]
-        elif not isinstance(x, List):  # constant literal
-            return x
-        elif x[0] is _quote:  # quotation
-            (_, exp) = x
-            return exp
-        elif x[0] is _if:  # conditional
-            (_, test, conseq, alt) = x
-            x = (conseq if eval(test, env) else alt)
-        elif x[0] is _set:  # assignment
-            (_, var, exp) = x
-            env.find(var)[var] = eval(exp, env)
-            return None
-        elif x[0] is _define:  # definition
-            (_, var, exp) = x
-            env[var] = eval(exp, env)
-            return None
-        elif x[0] is _lambda:  # (lambda (var*) exp)
-            (_, parms, exp) = x
-            return Procedure(parms, exp, env)
-        elif x[0] is _begin:  # (begin exp+)
-            for exp in x[1:-1]:
-                eval(exp, env)
-            x = x[-1]
+        if type(x) is Symbol:  # variable reference
+            return env.lookup(x)
+        elif type(x) is not ASTList:
+            if isinstance(x, list):  # code built as plain lists, e.g. by let
+                x = to_ast(x)
+                continue
+            return x  # constant literal
+        form = special_forms.get(id(x[0]))
+        if form is not None:  # special form
+            x, tail_env = form(x, env)
+            if tail_env is None:
+                return x
+            env = tail_env
         else:  # (proc exp*)
-            exps = [eval(exp, env) for exp in x]
+            # No inline cache for the operator: Procedure bodies run on the
+            # VM, so only top-level forms get here, and each runs once.
+            exps: list = [evaluate(exp, env) for exp in x]
             proc = exps.pop(0)
-            if isinstance(proc, Procedure):
-                x = proc.exp
-                env = Env(proc.parms, exps, proc.env)
-            else:
-                return proc(*exps)
+            if type(proc) is Procedure:
+                if proc.fn is not None and proc.memo is None:
+                    try:
+                        return proc.fn(*exps)
+                    except Deopt:
+                        proc.fn = None
+                return run(proc, exps)
+            return proc(*exps)
+
+# Old name, kept for existing callers
+eval = evaluate
 
+# Special forms return (value, None), or (x, env) to have evaluate continue
+# with x in env, which keeps tail positions iterative.
 
+def eval_quote(x, env):  # (quote exp)
+    (_, exp) = x
+    return exp, None
+
+def eval_if(x, env):  # (if test conseq alt)
+    (_, test, conseq, alt) = x
+    return (conseq if evaluate(test, env) else alt), env
+
+def eval_set(x, env):  # (set! var exp)
+    (_, var, exp) = x
+    env.assign(var, evaluate(exp, env))
+    return None, None
+
+def eval_define(x, env):  # (define var exp)
+    (_, var, exp) = x
+    env.define(var, evaluate(exp, env))
+    return None, None
+
+def eval_lambda(x, env):  # (lambda (var*) exp)
+    (_, parms, exp) = x
+    return Procedure(parms, exp, env), None
+
+def eval_begin(x, env):  # (begin exp+)
+    for exp in x[1:-1]:
+        evaluate(exp, env)
+    return x[-1], env
+
+# Jump table keyed on the identity of the interned head Symbol
+special_forms = {id(_quote): eval_quote, id(_if): eval_if, id(_set): eval_set,
+                 id(_define): eval_define, id(_lambda): eval_lambda, id(_begin): eval_begin}
+
+
+@final
 class Procedure():
     """
     A user-defined Scheme procedure.
     """
-    def __init__(self, parms, exp, env):
+    def __init__(self, parms, exp, env, code=None):
         self.parms, self.exp, self.env = parms, exp, env
+        self.code = Code(parms, exp) if code is None else code
+        # {memo_key(args): value} once (memoize proc) is called, else None
+        self.memo = None
+        # exp compiled to a Python function, if it could be
+        self.fn = self.code.function(env)
 
     def __call__(self, *args):
-        return eval(self.exp, Env(self.parms, args, self.env))
+        if self.fn is not None and self.memo is None:
+            try:
+                return self.fn(*args)
+            except Deopt:
+                self.fn = None
+        return run(self, list(args))
+
+
+# memoization
+
+# Results kept per memoized procedure, least recently used dropped first
+memo_limit = 10000
+
+def exact_key(x):
+    """
+    A key for x, equal only for values of the same type and exact value:
+    unlike ==, it tells 1 from 1.0 and 0.0 from -0.0.
+    """
+    if type(x) is float:
+        return float, x.hex()
+    elif type(x) is complex:
+        return complex, x.real.hex(), x.imag.hex()
+    return type(x), x
+
+def memo_key(args):
+    """
+    Memo table key for args, or None if they are unhashable.
+    """
+    key = tuple(map(exact_key, args))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def remember(saving, val):
+    """
+    Store val for the (memo, key) pair of a finished memoized call.
+    """
+    memo, key = saving
+    if key is not None:
+        memo[key] = val
+        if len(memo) > memo_limit:
+            memo.popitem(last=False)
+
+
+# compile and run (bytecode VM)
+
+(LOAD_CONST, LOAD_LOCAL, LOAD_GLOBAL, SET_LOCAL, SET_GLOBAL, DEFINE, POP,
+ JUMP, JUMP_IF_FALSE, CALL, TAIL_CALL, RET, MAKE_CLOSURE, BINARY_OP) = range(14)
+
+# Two-argument calls to these builtins compile to BINARY_OP, which applies
+# the binary kernel straight to the stack while the name is still bound to
+# the builtin: {var: (builtin, kernel)}
+binary_prims = {Sym(name): (global_env.lookup(Sym(name)), kernel) for name, kernel in {
+    '+':op.add, '-':op.sub, '*':op.mul, '/':op.truediv,
+    '>':op.gt, '<':op.lt, '>=':op.ge, '<=': op.le, '=':op.eq}.items()}
+
+
+class Code():
+    """
+    The compiled body of a lambda, shared by every closure made from it.
+    """
+    def __init__(self, parms, exp):
+        self.parms, self.exp = parms, exp
+        self.instrs = None
+        self.pycode = None  # Python code object; False if exp has none
+
+    def compile(self):
+        """
+        Compile exp into a flat list of (OP, arg) instructions.
+        Parameters live in numbered slots, unless the body defines names or
+        creates closures; then the frame must be a real Env.
+        """
+        self.instrs, self.consts, self.names = [], [], []
+        self.needs_env = needs_env(self.exp)
+        if self.needs_env:
+            locals_index = {}
+        elif isinstance(self.parms, Symbol):
+            locals_index = {self.parms: 0}
+        else:
+            locals_index = {var: i for i, var in enumerate(self.parms)}
+        compile_expr(self.exp, locals_index, self, tail=True)
+
+    def const(self, value):
+        """
+        Index of value in the constant pool.
+        """
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def name(self, var):
+        """
+        Index of var in the name table.
+        """
+        if var not in self.names:
+            self.names.append(var)
+        return self.names.index(var)
+
+    def function(self, env):
+        """
+        A Python function for a closure over env, or None if exp can't be
+        compiled to Python. The code object is built once and shared.
+        """
+        if self.pycode is None:
+            try:
+                self.pycode, self.pyconsts = compile_python(self.parms, self.exp, env)
+            except (NotImplementedError, ValueError, SyntaxError, RecursionError):
+                self.pycode = False
+        if self.pycode is False:
+            return None
+        return FunctionType(self.pycode, dict(self.pyconsts, _lookup=env.lookup))
+
+
+def needs_env(x):
+    """
+    Does x define names or build closures, so its frame must be an Env?
+    """
+    if type(x) is not ASTList or not x or x[0] is _quote:
+        return False
+    elif x[0] is _define or x[0] is _lambda:
+        return True
+    else:
+        return any(needs_env(exp) for exp in x)
+
+
+def compile_expr(x, locals_index, code, tail=False):
+    """
+    Append the instructions that evaluate x to code.instrs.
+    In tail position the value is returned and calls become TAIL_CALLs.
+    """
+    instrs = code.instrs
+    kind = type(x)
+    if kind is Symbol:  # variable reference
+        if x in locals_index:
+            instrs.append((LOAD_LOCAL, locals_index[x]))
+        else:
+            instrs.append((LOAD_GLOBAL, code.name(x)))
+    elif kind is not ASTList:  # constant literal
+        instrs.append((LOAD_CONST, code.const(x)))
+    elif x[0] is _quote:  # quotation
+        (_, exp) = x
+        instrs.append((LOAD_CONST, code.const(exp)))
+    elif x[0] is _if:  # conditional
+        (_, test, conseq, alt) = x
+        compile_expr(test, locals_index, code)
+        jump_if_false = len(instrs)
+        instrs.append(None)
+        compile_expr(conseq, locals_index, code, tail)
+        if not tail:
+            jump = len(instrs)
+            instrs.append(None)
+        instrs[jump_if_false] = (JUMP_IF_FALSE, len(instrs))
+        compile_expr(alt, locals_index, code, tail)
+        if not tail:
+            instrs[jump] = (JUMP, len(instrs))
+        return
+    elif x[0] is _set:  # assignment
+        (_, var, exp) = x
+        compile_expr(exp, locals_index, code)
+        if var in locals_index:
+            instrs.append((SET_LOCAL, locals_index[var]))
+        else:
+            instrs.append((SET_GLOBAL, code.name(var)))
+    elif x[0] is _define:  # definition
+        (_, var, exp) = x
+        compile_expr(exp, locals_index, code)
+        instrs.append((DEFINE, code.name(var)))
+    elif x[0] is _lambda:  # (lambda (var*) exp)
+        (_, parms, exp) = x
+        instrs.append((MAKE_CLOSURE, code.const(Code(parms, exp))))
+    elif x[0] is _begin:  # (begin exp+)
+        for exp in x[1:-1]:
+            compile_expr(exp, locals_index, code)
+            instrs.append((POP, None))
+        compile_expr(x[-1], locals_index, code, tail)
+        return
+    elif len(x) == 3 and type(x[0]) is Symbol and x[0] in binary_prims and x[0] not in locals_index:
+        for exp in x[1:]:
+            compile_expr(exp, locals_index, code)
+        instrs.append((BINARY_OP, (x[0],) + binary_prims[x[0]]))
+    else:  # (proc exp*)
+        for exp in x:
+            compile_expr(exp, locals_index, code)
+        if tail:
+            # A TAIL_CALL to a Procedure reuses the frame and never reaches
+            # the RET; a builtin's value falls through to it.
+            instrs.append((TAIL_CALL, len(x) - 1))
+        else:
+            instrs.append((CALL, len(x) - 1))
+    if tail:
+        instrs.append((RET, None))
+
+
+def enter(proc, args):
+    """
+    Set up a frame for calling proc: its code, Env and local slots.
+    """
+    code = proc.code
+    if code.instrs is None:
+        code.compile()
+    if code.needs_env:
+        return code, Env(code.parms, args, proc.env), None
+    elif isinstance(code.parms, Symbol):
+        return code, proc.env, [list(args)]
+    elif len(args) != len(code.parms):
+        raise TypeError('expected %s, given %s, ' % (to_string(code.parms), to_string(args)))
+    return code, proc.env, args
+
+
+def run(proc, args):
+    """
+    Call Procedure proc on the list args with the bytecode VM.
+    Calls between Procedures push a frame instead of recursing in Python.
+    """
+    stack, frames = [], []
+    saving = None  # (memo, key) to store the current frame's result in
+    if proc.memo is not None:
+        key = memo_key(args)
+        if key is not None and key in proc.memo:
+            proc.memo.move_to_end(key)
+            return proc.memo[key]
+        saving = (proc.memo, key)
+    code, env, local = enter(proc, args)
+    instrs, consts, names = code.instrs, code.consts, code.names
+    ip = 0
+    while True:
+        opcode, arg = instrs[ip]
+        ip += 1
+        if opcode == LOAD_LOCAL:
+            stack.append(local[arg])
+        elif opcode == LOAD_GLOBAL:
+            stack.append(env.lookup(names[arg]))
+        elif opcode == LOAD_CONST:
+            stack.append(consts[arg])
+        elif opcode == BINARY_OP:
+            var, prim, kernel = arg
+            proc = env.lookup(var)
+            b = stack.pop()
+            if proc is prim:
+                stack[-1] = kernel(stack[-1], b)
+            else:  # var was rebound: make an ordinary call
+                a = stack.pop()
+                if type(proc) is Procedure and proc.memo is None:
+                    frames.append((code, local, env, ip, saving))
+                    saving = None
+                    code, env, local = enter(proc, [a, b])
+                    instrs, consts, names = code.instrs, code.consts, code.names
+                    ip = 0
+                else:
+                    stack.append(proc(a, b))
+        elif opcode == JUMP_IF_FALSE:
+            if not stack.pop():
+                ip = arg
+        elif opcode == CALL or opcode == TAIL_CALL:
+            base = len(stack) - arg
+            exps = stack[base:]
+            del stack[base:]
+            proc = stack.pop()
+            if type(proc) is Procedure:
+                memo = proc.memo
+                if memo is not None:
+                    key = memo_key(exps)
+                    if key is not None and key in memo:
+                        memo.move_to_end(key)
+                        stack.append(memo[key])
+                        continue
+                elif proc.fn is not None:  # CPython runs it; RET follows
+                    try:
+                        stack.append(proc.fn(*exps))
+                        continue
+                    except Deopt:
+                        proc.fn = None
+                # A memoized frame must see its callee return to save the
+                # result, so tail calls from it push a frame too
+                if opcode == CALL or saving is not None:
+                    frames.append((code, local, env, ip, saving))
+                saving = None if memo is None else (memo, key)
+                code, env, local = enter(proc, exps)
+                instrs, consts, names = code.instrs, code.consts, code.names
+                ip = 0
+            else:
+                stack.append(proc(*exps))
+        elif opcode == RET:
+            if saving is not None:
+                remember(saving, stack[-1])
+            if not frames:
+                return stack.pop()
+            code, local, env, ip, saving = frames.pop()
+            instrs, consts, names = code.instrs, code.consts, code.names
+        elif opcode == JUMP:
+            ip = arg
+        elif opcode == POP:
+            stack.pop()
+        elif opcode == SET_LOCAL:
+            local[arg] = stack[-1]
+            stack[-1] = None
+        elif opcode == SET_GLOBAL:
+            env.assign(names[arg], stack[-1])
+            stack[-1] = None
+        elif opcode == DEFINE:
+            env.define(names[arg], stack[-1])
+            stack[-1] = None
+        elif opcode == MAKE_CLOSURE:
+            lam = consts[arg]
+            stack.append(Procedure(lam.parms, lam.exp, env, lam))
+
+
+# compile to Python
+
+class Deopt(Exception):
+    """
+    Raised by a compiled Procedure whose callees have been rebound since it
+    was compiled; the caller runs it on the VM instead.
+    """
+
+def compile_python(parms, exp, env):
+    """
+    Translate a lambda into a Python code object whose parameters are
+    Python locals, plus the constants it refers to. Free variables are
+    still looked up in the closure's Env (_lookup) when it runs.
+    Raise NotImplementedError unless exp only calls builtins: a call to a
+    Procedure from Python would lose tail calls and the VM's frame stack.
+    The builtins are called directly, behind a guard on entry that raises
+    Deopt if any callee name no longer resolves to the same builtin.
+    """
+    if type(parms) is not ASTList or not all(type(var) is Symbol for var in parms):
+        raise NotImplementedError('parameters must be a list of symbols')
+    names = {var: 'p%d' % i for i, var in enumerate(parms)}
+    if len(names) != len(parms):
+        raise NotImplementedError('repeated parameter')
+    consts, callees = {'_Deopt': Deopt}, {}
+    body = transpile(exp, names, consts, callees, env)
+    src = 'def _f(%s):\n' % ', '.join(names.values())
+    if callees:
+        src += '    if %s:\n        raise _Deopt\n' % ' or '.join(
+            '_lookup(%s) is not %s' % callee for callee in callees.values())
+    namespace = dict(consts)
+    exec(compile(src + '    return %s' % body, '<lispy>', 'exec'), namespace)
+    return namespace['_f'].__code__, consts
+
+
+def transpile(x, names, consts, callees, env):
+    """
+    Translate expression x into a Python expression string.
+    names maps the lambda's parameters to Python names; values without a
+    literal form are added to consts. callees maps each procedure name
+    called to the names of its Symbol and of the builtin it resolved to.
+    """
+    if type(x) is Symbol:  # variable reference
+        if x in names:
+            return names[x]
+        return '_lookup(%s)' % transpile_const(x, consts)
+    elif type(x) is int:  # constant literal
+        return repr(x)
+    elif type(x) is not ASTList:  # constant literal
+        return transpile_const(x, consts)
+    elif not x:
+        raise NotImplementedError('empty combination')
+    elif x[0] is _quote:  # (quote exp)
+        (_, exp) = x
+        return transpile_const(exp, consts)
+    elif x[0] is _if:  # (if test conseq alt)
+        (_, test, conseq, alt) = x
+        return '(%s if %s else %s)' % (transpile(conseq, names, consts, callees, env),
+                                       transpile(test, names, consts, callees, env),
+                                       transpile(alt, names, consts, callees, env))
+    elif x[0] is _begin and len(x) > 1:  # (begin exp+)
+        return '(%s,)[-1]' % ', '.join(transpile(exp, names, consts, callees, env)
+                                       for exp in x[1:])
+    elif type(x[0]) is not Symbol or x[0] in names or id(x[0]) in special_forms:
+        raise NotImplementedError('not a call to a named procedure')
+    else:  # (proc exp*)
+        try:
+            proc = env.lookup(x[0])
+        except LookupError:
+            raise NotImplementedError('unbound procedure') from None
+        if type(proc) is Procedure or not callable(proc):
+            raise NotImplementedError('call to a Procedure')
+        if x[0] not in callees:
+            callees[x[0]] = (transpile_const(x[0], consts), transpile_const(proc, consts))
+        return '%s(%s)' % (callees[x[0]][1],
+                           ', '.join(transpile(exp, names, consts, callees, env) for exp in x[1:]))
+
+
+def transpile_const(value, consts):
+    """
+    Name under which value is passed to the Python function.
+    """
+    var = '_k%d' % len(consts)
+    consts[var] = value
+    return var
 
 
 # expand
@@ -300,8 +923,77 @@ class Procedure():
 def expand(x, toplevel=False):
     """
     Walk tree of x, making optimization/fixes, and signaling Syntax Error.
+    Lists come back as ASTLists, including those built by macros.
     """
-    pass
+    require(x, x != [])  # () => Error
+    if not isinstance(x, list):  # constant => unchanged
+        return x
+    elif x[0] is _quote:  # (quote exp)
+        require(x, len(x) == 2)
+        return ASTList(x)
+    elif x[0] is _if:
+        if len(x) == 3:  # (if t c) => (if t c None)
+            x = x + [None]
+        require(x, len(x) == 4)
+        return ASTList(map(expand, x))
+    elif x[0] is _set:
+        require(x, len(x) == 3)
+        var = x[1]  # (set! non-var exp) => Error
+        require(x, isinstance(var, Symbol), "can set! only a symbol")
+        return ASTList([_set, var, expand(x[2])])
+    elif x[0] is _define or x[0] is _definemacro:
+        require(x, len(x) >= 3)
+        _def, v, body = x[0], x[1], x[2:]
+        if isinstance(v, list) and v:  # (define (f args) body)
+            f, args = v[0], v[1:]      #  => (define f (lambda (args) body))
+            return expand([_def, f, [_lambda, args] + body], toplevel)
+        require(x, len(x) == 3)  # (define non-var/list exp) => Error
+        require(x, isinstance(v, Symbol), "can define only a symbol")
+        exp = expand(x[2])
+        if _def is _definemacro:
+            require(x, toplevel, "define-macro only allowed at top level")
+            proc = evaluate(exp)
+            require(x, callable(proc), "macro must be a procedure")
+            macro_table[v] = proc  # (define-macro v proc)
+            return None            #  => None; add v:proc to macro_table
+        return ASTList([_define, v, exp])
+    elif x[0] is _begin:
+        if len(x) == 1:  # (begin) => None
+            return None
+        return ASTList(expand(xi, toplevel) for xi in x)
+    elif x[0] is _lambda:  # (lambda (x) e1 e2)
+        require(x, len(x) >= 3)  #  => (lambda (x) (begin e1 e2))
+        vars, body = x[1], x[2:]
+        require(x, (isinstance(vars, list) and all(isinstance(v, Symbol) for v in vars))
+                or isinstance(vars, Symbol), "illegal lambda argument list")
+        exp = body[0] if len(body) == 1 else [_begin] + body
+        return ASTList([_lambda, to_ast(vars), expand(exp)])
+    elif x[0] is _quasiquote:  # `x => expand_quasiquote(x)
+        require(x, len(x) == 2)
+        return expand(expand_quasiquote(x[1]))
+    elif isinstance(x[0], Symbol) and x[0] in macro_table:
+        return expand(macro_table[x[0]](*x[1:]), toplevel)  # (m arg...)
+    else:  # (f arg...) => expand each
+        return ASTList(map(expand, x))
+
+def expand_quasiquote(x):
+    """
+    Expand `x => 'x; `,x => x; `(,@x y) => (append x y)
+    """
+    if not is_pair(x):
+        return [_quote, x]
+    require(x, x[0] is not _unquotesplicing, "can't splice here")
+    if x[0] is _unquote:
+        require(x, len(x) == 2)
+        return x[1]
+    elif is_pair(x[0]) and x[0][0] is _unquotesplicing:
+        require(x[0], len(x[0]) == 2)
+        return [_append, x[0][1], expand_quasiquote(x[1:])]
+    else:
+        return [_cons, expand_quasiquote(x[0]), expand_quasiquote(x[1:])]
+
+def is_pair(x):
+    return x != [] and isinstance(x, list)
 
 def require(x, predicate, msg="wrong length"):
     """
@@ -313,19 +1005,18 @@ def require(x, predicate, msg="wrong length"):
 
 
 def let(*args):
-    args = list(args)
-    x = cons(_let, args)
+    x = cons(_let, list(args))
     require(x, len(args) > 1)
     bindings, body = args[0], args[1:]
     require(x, all(isinstance(b, list) and len(b) == 2 and isinstance(b[0], Symbol) for b in bindings), "illegal binding list")
     vars, vals = zip(*bindings)
-    return [[_lambda, list(vars)] + map(expand, body)] + map(expand, vals)
+    return [[_lambda, list(vars)] + list(map(expand, body))] + list(map(expand, vals))
 
 _append, _cons, _let = map(Sym, "append cons let".split())
 
 macro_table = {_let: let}  # More macros can go here
 
-eval(parse("""(begin
+evaluate(parse("""(begin
 
 (define-macro and (lambda args
    (if (null? args) #t
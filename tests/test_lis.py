@@ -0,0 +1,82 @@
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lis import add, atom, evaluate, parse, schemestr
+
+
+def run(*exps):
+    """
+    Evaluate each expression string in turn, returning the last value.
+    """
+    val = None
+    for exp in exps:
+        val = evaluate(parse(exp))
+    return val
+
+
+class ProcedureTest(unittest.TestCase):
+
+    def test_recursion(self):
+        run('(define fact (lambda (n) (if (< n 2) 1 (* n (fact (- n 1))))))')
+        self.assertEqual(run('(fact 20)'), 2432902008176640000)
+
+    def test_closure_with_set(self):
+        run('(define make-counter (lambda () ((lambda (c) (lambda () (begin (set! c (+ c 1)) c))) 0)))',
+            '(define counter-a (make-counter))',
+            '(define counter-b (make-counter))')
+        self.assertEqual(run('(counter-a)', '(counter-a)', '(counter-a)'), 3)
+        self.assertEqual(run('(counter-b)'), 1)
+
+    def test_closures_keep_their_env(self):
+        run('(define adders (lambda (n) (if (= n 0) (quote ()) (cons (lambda (x) (+ x n)) (adders (- n 1))))))')
+        self.assertEqual([f(10) for f in run('(adders 3)')], [13, 12, 11])
+
+    def test_set_global(self):
+        run('(define total 1)', '(define add-total (lambda (x) (set! total (+ total x))))')
+        self.assertEqual(run('(add-total 5)', 'total'), 6)
+
+    def test_set_non_symbol(self):
+        run('(define set-car (lambda (x) (set! (car x) 1)))')
+
+    def test_set_unbound(self):
+        run('(define set-unbound (lambda (x) (set! no-such-variable x)))')
+        with self.assertRaises(LookupError):
+            run('(set-unbound 1)')
+
+
+class AddTest(unittest.TestCase):
+
+    def test_add(self):
+        self.assertEqual(add(10**400, 1), 10**400 + 1)
+        self.assertEqual(add(1e100, 1.0, -1e100), 1.0)
+        self.assertEqual(add(1e308, 1e308), math.inf)
+        self.assertEqual(add(1, math.inf), math.inf)
+        self.assertEqual(add('ab', 'cd'), 'abcd')
+
+
+class ReaderTest(unittest.TestCase):
+
+    def test_atoms(self):
+        self.assertEqual(atom('-inf'), -math.inf)
+        self.assertTrue(math.isnan(atom('+nan')))
+        self.assertEqual(atom('1_000'), 1000)
+        self.assertIs(type(atom('1_000')), int)
+        self.assertEqual(atom('-2.5e3'), -2500.0)
+        self.assertEqual(atom('abc'), 'abc')
+
+    def test_unbalanced(self):
+        with self.assertRaises(SyntaxError):
+            parse('(+ 1 2')
+        with self.assertRaises(SyntaxError):
+            parse(')')
+
+    def test_schemestr(self):
+        self.assertEqual(schemestr(parse('(a (b ()) 1.5)')), '(a (b ()) 1.5)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import lispy
+from lispy import InPort, PreTokenizedPort, Sym, add, eof_object, evaluate, parse, to_string
+
+
+def run(text):
+    """
+    Evaluate every expression in text, returning the last value.
+    """
+    port = PreTokenizedPort(text)
+    val = None
+    while True:
+        x = parse(port)
+        if x is eof_object:
+            return val
+        val = evaluate(x)
+
+
+class TailCallTest(unittest.TestCase):
+
+    def test_deep_self_recursion(self):
+        run('(define (tc-loop n acc) (if (= n 0) acc (tc-loop (- n 1) (+ acc 1))))')
+        self.assertEqual(run('(tc-loop 100000 0)'), 100000)
+
+    def test_mutual_recursion(self):
+        run('''(define (tc-even? n) (if (= n 0) #t (tc-odd? (- n 1))))
+               (define (tc-odd? n) (if (= n 0) #f (tc-even? (- n 1))))''')
+        self.assertIs(run('(tc-even? 100000)'), True)
+        self.assertIs(run('(tc-odd? 100001)'), True)
+
+    def test_higher_order(self):
+        run('''(define (tc-apply1 f) (lambda (x) (f x)))
+               (define (tc-count n) (if (= n 0) 0 ((tc-apply1 tc-count) (- n 1))))''')
+        self.assertEqual(run('((tc-apply1 abs) -3)'), 3)
+        self.assertEqual(run('(tc-count 3000)'), 0)
+
+    def test_compiled_callee_rebound_to_procedure(self):
+        # f is compiled while g is still the builtin abs
+        run('''(define tc-g abs)
+               (define (tc-f n) (tc-g n))
+               (define (tc-g n) (if (= n 0) 0 (tc-f (- n 1))))''')
+        self.assertEqual(run('(tc-f 100000)'), 0)
+
+    def test_compiled_callee_rebound_to_builtin(self):
+        run('(define tc-max max) (define (tc-h x) (tc-max x 1))')
+        self.assertEqual(run('(tc-h 5)'), 5)
+        run('(define tc-max min)')
+        self.assertEqual(run('(tc-h 5)'), 1)
+
+
+class ProcedureTest(unittest.TestCase):
+
+    def test_closure_with_set(self):
+        run('''(define (make-counter)
+                 (define c 0)
+                 (lambda () (set! c (+ c 1)) c))
+               (define counter-a (make-counter))
+               (define counter-b (make-counter))''')
+        self.assertEqual(run('(counter-a) (counter-a) (counter-a)'), 3)
+        self.assertEqual(run('(counter-b)'), 1)
+
+    def test_set_global(self):
+        run('(define set-total 1) (define (set-add x) (set! set-total (+ set-total x)))')
+        self.assertEqual(run('(set-add 5) set-total'), 6)
+
+    def test_set_unbound(self):
+        run('(define (set-unbound x) (set! no-such-variable x))')
+        with self.assertRaises(LookupError):
+            run('(set-unbound 1)')
+
+    def test_variadic(self):
+        run('(define var-list (lambda args args))')
+        self.assertEqual(run('(var-list 1 2 3)'), [1, 2, 3])
+        self.assertEqual(run('(var-list)'), [])
+
+    def test_macros(self):
+        self.assertEqual(run('(let ((x 1) (y 2)) (+ x y))'), 3)
+        self.assertIs(run('(and)'), True)
+        self.assertIs(run('(and 1 #f 3)'), False)
+        self.assertEqual(run("`(1 ,(+ 1 1) ,@(list 3 4))"), [1, 2, 3, 4])
+
+
+class MemoizeTest(unittest.TestCase):
+
+    def test_memoized_recursion(self):
+        run('(define memo-fib (memoize (lambda (n) (if (< n 2) n (+ (memo-fib (- n 1)) (memo-fib (- n 2)))))))')
+        self.assertEqual(run('(memo-fib 90)'), 2880067194370816120)
+
+    def test_keys_are_exact(self):
+        run('(define memo-twice (memoize (lambda (x) (+ x x))))')
+        self.assertIs(type(run('(memo-twice 1)')), int)
+        self.assertIs(type(run('(memo-twice 1.0)')), float)
+        run('(define memo-angle (memoize (lambda (y) (atan2 y -1))))')
+        self.assertEqual(run('(memo-angle 0.0)'), math.pi)
+        self.assertEqual(run('(memo-angle -0.0)'), -math.pi)
+
+    def test_unhashable_args(self):
+        run('(define memo-len (memoize (lambda (x) (length x))))')
+        self.assertEqual(run("(memo-len '(1 2 3))"), 3)
+
+
+class AddTest(unittest.TestCase):
+
+    def test_ints(self):
+        self.assertEqual(add(), 0)
+        self.assertEqual(add(10**400, 1), 10**400 + 1)
+
+    def test_floats(self):
+        self.assertEqual(add(1e100, 1.0, -1e100), 1.0)
+        self.assertEqual(add(1e308, 1e308), math.inf)
+        self.assertEqual(add(1, math.inf), math.inf)
+        self.assertTrue(math.isnan(add(math.inf, -math.inf)))
+
+    def test_other_types(self):
+        self.assertEqual(run('(+ "ab" "cd")'), 'abcd')
+        self.assertEqual(run("(+ '(1) '(2))"), [1, 2])
+        self.assertEqual(add(1, 2j), 1 + 2j)
+
+
+class ReaderTest(unittest.TestCase):
+
+    def test_atoms(self):
+        self.assertEqual(run('-inf'), -math.inf)
+        self.assertTrue(math.isnan(run('+nan')))
+        self.assertEqual(run('1_000'), 1000)
+        self.assertEqual(run('-2.5e3'), -2500.0)
+        self.assertEqual(run('1+2i'), 1 + 2j)
+        self.assertEqual(run('"a\\nb"'), 'a\nb')
+        self.assertEqual(parse("'abc"), [Sym('quote'), Sym('abc')])
+
+    def test_comments(self):
+        self.assertEqual(run('; leading\n(+ 1 ; inner\n 2) ; trailing'), 3)
+
+    def test_unterminated_string(self):
+        with self.assertRaises(SyntaxError):
+            run('(display "abc)')
+        port = InPort(io.StringIO('"abc\n42\n'))
+        with self.assertRaises(SyntaxError):
+            parse(port)
+        self.assertEqual(parse(port), 42)
+
+    def test_unbalanced(self):
+        with self.assertRaises(SyntaxError):
+            run('(+ 1 2')
+        with self.assertRaises(SyntaxError):
+            run(')')
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            empty, defs = os.path.join(tmp, 'empty.scm'), os.path.join(tmp, 'defs.scm')
+            open(empty, 'w').close()
+            with open(defs, 'w') as f:
+                f.write('(define load-x 1)\n; comment\n(define load-y (+ load-x 1))\n')
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                lispy.load(empty)
+                lispy.load(defs)
+        self.assertEqual(run('load-y'), 2)
+
+
+class ToStringTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(to_string([1, [], [Sym('a'), [True, False]]]), '(1 () (a (#t #f)))')
+        self.assertEqual(to_string('say "hi"\n'), r'"say \"hi\"\n"')
+        self.assertEqual(to_string(1 + 2j), '1+2i')
+        self.assertEqual(to_string(run("'(1 (2 \"x\"))")), '(1 (2 "x"))')
+
+    def test_deep_nesting(self):
+        x = []
+        for _ in range(10000):
+            x = [x]
+        self.assertEqual(to_string(x), '(' * 10001 + ')' * 10001)
+
+
+if __name__ == '__main__':
+    unittest.main()